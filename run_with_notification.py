@@ -16,55 +16,89 @@ import sys
 import os
 import time
 import argparse
-import platform
-import threading
-from typing import List, Optional, Tuple, Union
-from datetime import datetime
+import selectors
+import locale
+from collections import deque
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Tuple, Union
 import shlex
-from queue import Queue, Empty
+import functools
+import re
 
-from send_email import EmailNotifier
+if TYPE_CHECKING:
+    # threading 只在 Windows 下运行时按需导入，这里仅用于类型注解
+    import threading
 
 
-def detect_command_type(command: List[str]) -> str:
+# Python相关命令
+_PYTHON_COMMANDS = frozenset({
+    'python', 'python3', 'python2', 'py',
+    'pip', 'pip3', 'pip2',
+    'conda', 'poetry', 'pipenv',
+    'jupyter', 'ipython',
+    'pytest', 'python-m'
+})
+
+# 系统命令
+_SYSTEM_COMMANDS = frozenset({
+    'ls', 'dir', 'cd', 'mkdir', 'rmdir', 'rm', 'del',
+    'cp', 'copy', 'mv', 'move', 'chmod', 'chown',
+    'ps', 'top', 'htop', 'kill', 'killall',
+    'wget', 'curl', 'git', 'docker', 'docker-compose',
+    'npm', 'yarn', 'node', 'make', 'cmake',
+    'gcc', 'g++', 'javac', 'java',
+    'tar', 'zip', 'unzip', 'gzip', 'gunzip'
+})
+
+# shell 操作符（管道、重定向、命令链等），&&、|| 已包含在单字符匹配中
+_SHELL_OP_RE = re.compile(r'[|<>;&]')
+
+# 按行拆分输出（保留行尾的 \r\n、\r 或 \n），用于给 stderr 的每一行加前缀
+_LINE_SEGMENT_RE = re.compile(rb'[^\r\n]*(?:\r\n|\r|\n)?')
+
+# 与文本模式的通用换行一致，\r\n、\r 和 \n 都视为换行
+_NEWLINE_RE = re.compile(rb'\r\n|\r|\n')
+
+# 记录输出时暂存的不完整行的最大字节数，超出部分只保留结尾
+_MAX_PARTIAL_LINE = 64 * 1024
+
+# 当前操作系统名称（与 platform.system() 一致），避免导入 platform 模块
+_SYSTEM = 'Windows' if os.name == 'nt' else os.uname().sysname
+
+# 创建子进程时显式使用的参数：不使用 preexec_fn、不切换用户/组、不传 env，
+# 保证 Linux 上走 vfork + exec 的快速路径，内存占用大的进程也能快速启动。
+# posix_spawn 路径要求 close_fds=False，会让子进程继承本进程的文件描述符，因此不采用。
+_SPAWN_KWARGS = {
+    'close_fds': True,
+    'preexec_fn': None,
+    'restore_signals': True,
+    'start_new_session': False,
+    'pass_fds': ()
+}
+
+# 子进程输出的解码方式（与 text=True 时一致）
+_OUTPUT_ENCODING = locale.getpreferredencoding(False)
+
+# Windows 下 select 不支持管道，只能退回到线程读取
+_USE_SELECTOR = os.name != 'nt'
+
+
+@functools.lru_cache(maxsize=256)
+def detect_command_type(first_cmd: str) -> str:
     """
     检测命令类型
     
     Args:
-        command: 命令列表
+        first_cmd: 命令的第一个单词（可执行程序名）
         
     Returns:
         命令类型: 'python', 'shell', 'system'
     """
-    if not command:
-        return 'shell'
+    first_cmd = first_cmd.lower()
     
-    first_cmd = command[0].lower()
-    
-    # Python相关命令
-    python_commands = {
-        'python', 'python3', 'python2', 'py',
-        'pip', 'pip3', 'pip2',
-        'conda', 'poetry', 'pipenv',
-        'jupyter', 'ipython',
-        'pytest', 'python-m'
-    }
-    
-    if first_cmd in python_commands:
+    if first_cmd in _PYTHON_COMMANDS:
         return 'python'
     
-    # 系统命令
-    system_commands = {
-        'ls', 'dir', 'cd', 'mkdir', 'rmdir', 'rm', 'del',
-        'cp', 'copy', 'mv', 'move', 'chmod', 'chown',
-        'ps', 'top', 'htop', 'kill', 'killall',
-        'wget', 'curl', 'git', 'docker', 'docker-compose',
-        'npm', 'yarn', 'node', 'make', 'cmake',
-        'gcc', 'g++', 'javac', 'java',
-        'tar', 'zip', 'unzip', 'gzip', 'gunzip'
-    }
-    
-    if first_cmd in system_commands:
+    if first_cmd in _SYSTEM_COMMANDS:
         return 'system'
     
     # 默认为shell命令
@@ -81,14 +115,12 @@ def get_shell_command(command: List[str]) -> List[str]:
     Returns:
         适配shell的命令列表
     """
-    system = platform.system().lower()
-    
     # 检查是否是复杂的shell命令（包含管道、重定向等）
-    command_str = ' '.join(command)
-    has_shell_operators = any(op in command_str for op in ['|', '>', '<', '&&', '||', ';', '&'])
+    has_shell_operators = any(_SHELL_OP_RE.search(arg) for arg in command)
     
     if has_shell_operators:
-        if system == 'windows':
+        command_str = ' '.join(command)
+        if _SYSTEM == 'Windows':
             return ['cmd', '/c', command_str]
         else:
             return ['bash', '-c', command_str]
@@ -96,22 +128,427 @@ def get_shell_command(command: List[str]) -> List[str]:
     return command
 
 
-def stream_output(pipe, queue: Queue, prefix: str):
+class LogSummary(NamedTuple):
+    """输出摘要：开头几行、结尾几行（两者不重叠）以及总行数"""
+    head: List[str]
+    tail: List[str]
+    total: int
+
+
+class BoundedLog:
     """
-    实时读取进程输出并加入队列
+    只保留开头和结尾若干行的输出记录
+    
+    邮件中只会用到输出的前几行和最后几行，因此不保存完整输出，
+    内存占用与子进程的输出总量无关。
+    """
+    
+    def __init__(self, head: int = 5, tail: int = 5):
+        self.head_size = head
+        self.head: List[str] = []
+        self.tail = deque(maxlen=tail)
+        self.total_lines = 0
+        # 尚未遇到换行符的最后一行
+        self.partial = bytearray()
+        # 结尾处暂不计入的空行数
+        self.blank_lines = 0
+    
+    @classmethod
+    def from_message(cls, message: str) -> 'BoundedLog':
+        """创建只包含一条消息的记录"""
+        log = cls()
+        log.add(message)
+        return log
+    
+    def add(self, line: str):
+        """追加一行"""
+        if len(self.head) < self.head_size:
+            self.head.append(line)
+        else:
+            self.tail.append(line)
+        self.total_lines += 1
+    
+    def feed(self, data: bytes):
+        """
+        追加一段原始输出，只解码需要保留的行
+        
+        data 可以在一行的中间截断，最后不完整的一行先暂存，
+        等后续输出中出现换行符或调用 finish 时再记录。\r 也视为换行，
+        进度条的每次刷新记为一行；暂存的内容不超过 _MAX_PARTIAL_LINE 字节。
+        
+        Args:
+            data: 子进程输出的字节内容
+        """
+        partial = self.partial
+        partial += data
+        # 结尾的 \r 可能和下一段开头的 \n 组成 \r\n，先不处理
+        end = len(partial) - 1 if partial.endswith(b'\r') else len(partial)
+        cut = max(partial.rfind(b'\n', 0, end), partial.rfind(b'\r', 0, end))
+        if cut >= 0:
+            lines = _NEWLINE_RE.split(partial[:cut + 1])
+            lines.pop()
+            del partial[:cut + 1]
+            self._add_lines(lines)
+        if len(partial) > _MAX_PARTIAL_LINE:
+            del partial[:-_MAX_PARTIAL_LINE]
+    
+    def finish(self):
+        """记录最后没有以换行符结尾的一行"""
+        if self.partial:
+            self._add_lines([bytes(self.partial)])
+            self.partial.clear()
+    
+    def _add_lines(self, lines: List[bytes]):
+        """
+        追加若干行未解码的输出
+        
+        与对完整输出 strip() 后再分行一致，开头和结尾的空行不计入，
+        只有空行的输出总行数为 0。
+        """
+        # 最后一个非空行之后的空行先不计入，等后面出现输出时再补上
+        last = len(lines) - 1
+        while last >= 0 and not lines[last].strip():
+            last -= 1
+        if last < 0:
+            self.blank_lines += len(lines)
+            return
+        trailing = len(lines) - 1 - last
+        lines = lines[:last + 1]
+        
+        if not self.total_lines:
+            # 跳过开头的空行
+            first = 0
+            while not lines[first].strip():
+                first += 1
+            lines = lines[first:]
+        elif self.blank_lines:
+            # 只有开头和结尾保留的部分需要真正加入空行
+            keep = min(self.blank_lines, max(0, self.head_size - len(self.head)) + (self.tail.maxlen or 0))
+            self.total_lines += self.blank_lines - keep
+            lines = [b''] * keep + lines
+        self.blank_lines = trailing
+        
+        self.total_lines += len(lines)
+        
+        room = self.head_size - len(self.head)
+        if room > 0:
+            self.head.extend(decode_line(line) for line in lines[:room])
+            lines = lines[room:]
+        if lines and self.tail.maxlen:
+            self.tail.extend(decode_line(line) for line in lines[-self.tail.maxlen:])
+    
+    def summary(self) -> LogSummary:
+        """返回当前的输出摘要"""
+        return LogSummary(list(self.head), list(self.tail), self.total_lines)
+
+
+def decode_line(raw: bytes) -> str:
+    """将子进程输出的一行字节解码为字符串"""
+    return raw.decode(_OUTPUT_ENCODING, errors='replace').rstrip()
+
+
+def write_stream(stream, data: bytes):
+    """
+    将字节输出写入文本流
+    
+    优先写入底层的二进制缓冲区；流被替换为没有 buffer 的对象时
+    （如 io.StringIO、IDE 或 Jupyter 的控制台），解码后再写入。
+    """
+    buffer = getattr(stream, 'buffer', None)
+    if buffer is None:
+        stream.write(data.decode(_OUTPUT_ENCODING, errors='replace'))
+    else:
+        buffer.write(data)
+
+
+def display_output(source: str, data: bytes, line_start: bool = True):
+    """
+    显示一段输出
+    
+    直接写入底层的二进制缓冲区，不经过字符串编码，也不逐行刷新；
+    需要调用 flush_output 才会真正输出到终端。输出不需要以换行结尾，
+    进度条等用 \r 刷新的内容可以立即显示。
+    
+    Args:
+        source: 输出来源 ('STDOUT' 或 'STDERR')
+        data: 输出内容
+        line_start: data 是否从新的一行开始（决定 stderr 的第一段是否加前缀）
+    """
+    if source == 'STDOUT':
+        write_stream(sys.stdout, data)
+    elif source == 'STDERR':
+        parts = []
+        for segment in _LINE_SEGMENT_RE.findall(data):
+            if not segment:
+                continue
+            # 单独的行尾（如被拆开的 \r\n）不加前缀
+            if line_start and segment.strip(b'\r\n'):
+                parts.append(b'[stderr] ')
+            parts.append(segment)
+            line_start = segment.endswith((b'\r', b'\n'))
+        write_stream(sys.stderr, b''.join(parts))
+
+
+def flush_output():
+    """将已显示的输出刷新到终端"""
+    for stream in (sys.stdout, sys.stderr):
+        getattr(stream, 'buffer', stream).flush()
+
+
+def terminate_process(process: subprocess.Popen):
+    """结束子进程，5 秒内未退出则强制结束"""
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def stream_output(pipe, buffer: deque, ready: 'threading.Event', prefix: str):
+    """
+    实时读取进程输出并加入缓冲队列（Windows 下的线程读取方式）
+    
+    deque 的 append/popleft 本身是线程安全的，不需要像 queue.Queue 那样
+    每行都加锁；通过 ready 事件通知主线程有新的输出。
     
     Args:
         pipe: 进程的stdout或stderr管道
-        queue: 输出队列
+        buffer: 输出缓冲队列
+        ready: 有新输出时设置的事件
         prefix: 输出前缀（用于区分stdout和stderr）
     """
     try:
-        for line in iter(pipe.readline, ''):
-            if line:
-                queue.put((prefix, line.rstrip()))
+        # 有多少读多少，不等待换行符，进度条等不完整的行也能实时显示
+        for data in iter(lambda: pipe.read1(65536), b''):
+            buffer.append((prefix, data))
+            ready.set()
         pipe.close()
     except Exception as e:
-        queue.put((prefix, f"读取输出时出错: {e}"))
+        buffer.append((prefix, f"读取输出时出错: {e}\n".encode(_OUTPUT_ENCODING, errors='replace')))
+        ready.set()
+
+
+def collect_output_selector(
+    process: subprocess.Popen,
+    start_time: float,
+    timeout: Optional[int],
+    stdout_log: BoundedLog,
+    stderr_log: BoundedLog
+) -> bool:
+    """
+    在单线程中使用 selectors 实时读取进程的 stdout 和 stderr
+    
+    Linux 上通过 pidfd 把子进程退出也作为可读事件等待，没有输出时不会
+    周期性唤醒，子进程关闭输出管道后仍然等待其退出或超时；其他系统每秒
+    检查一次子进程状态。
+    
+    Args:
+        process: 子进程对象（以二进制管道方式创建）
+        start_time: 开始时间（time.monotonic() 的返回值）
+        timeout: 超时时间（秒）
+        stdout_log: 标准输出记录
+        stderr_log: 标准错误记录
+        
+    Returns:
+        超时返回 True，否则返回 False
+    """
+    sel = selectors.DefaultSelector()
+    logs = {'STDOUT': stdout_log, 'STDERR': stderr_log}
+    # 每个输出流最后显示的一个字节，用于判断是否处于行首
+    last_byte = {}
+    
+    for pipe, source in ((process.stdout, 'STDOUT'), (process.stderr, 'STDERR')):
+        fd = pipe.fileno()
+        os.set_blocking(fd, False)
+        sel.register(fd, selectors.EVENT_READ, source)
+        last_byte[source] = b'\n'
+    open_pipes = len(last_byte)
+    
+    # 子进程退出时 pidfd 变为可读（Linux 5.3+）
+    pidfd = None
+    if hasattr(os, 'pidfd_open'):
+        try:
+            pidfd = os.pidfd_open(process.pid)
+            sel.register(pidfd, selectors.EVENT_READ, 'PIDFD')
+        except OSError:
+            pidfd = None
+    
+    deadline = start_time + timeout if timeout else None
+    exited = False
+    timed_out = False
+    
+    sys.stdout.flush()
+    sys.stderr.flush()
+    
+    try:
+        # 有 pidfd 时即使管道都已关闭也继续等待，直到子进程真正退出或超时
+        while open_pipes or (pidfd is not None and not exited):
+            if exited:
+                # 子进程已退出，只读取管道中剩余的数据
+                wait = 0
+            else:
+                wait = None if pidfd is not None else 1.0
+                if deadline is not None:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    wait = remaining if wait is None else min(wait, remaining)
+            
+            events = sel.select(timeout=wait)
+            
+            for key, _ in events:
+                if key.data == 'PIDFD':
+                    sel.unregister(key.fd)
+                    exited = True
+                    continue
+                
+                try:
+                    data = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                
+                if not data:
+                    # 管道关闭
+                    sel.unregister(key.fd)
+                    open_pipes -= 1
+                    continue
+                
+                # 读到的内容立即显示，不等待换行符
+                display_output(key.data, data, last_byte[key.data] in (b'\r', b'\n'))
+                last_byte[key.data] = data[-1:]
+                logs[key.data].feed(data)
+            
+            # 每轮读取结束后统一刷新一次，保证实时显示
+            flush_output()
+            
+            # 进程已结束且管道暂时没有数据（例如被后台子进程继承）
+            if not events and (exited or process.poll() is not None):
+                break
+            
+            # 检查超时
+            if not exited and deadline is not None and time.monotonic() >= deadline:
+                timed_out = True
+                break
+    finally:
+        sel.close()
+        if pidfd is not None:
+            os.close(pidfd)
+    
+    # 记录残留的不完整行并补上换行（超时时也要记录，避免丢失结束前的最后输出）
+    for source, log in logs.items():
+        log.finish()
+        if last_byte[source] != b'\n':
+            display_output(source, b'\n', False)
+    flush_output()
+    
+    if timed_out:
+        return True
+    
+    # 子进程可能在关闭自己的输出管道后继续运行，超时仍然有效
+    if deadline is not None:
+        try:
+            process.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            return True
+    
+    return False
+
+
+def collect_output_threaded(
+    process: subprocess.Popen,
+    start_time: float,
+    timeout: Optional[int],
+    stdout_log: BoundedLog,
+    stderr_log: BoundedLog
+) -> bool:
+    """
+    使用读取线程实时获取进程输出（用于不支持 select 管道的 Windows）
+    
+    Args:
+        process: 子进程对象（以二进制管道方式创建）
+        start_time: 开始时间（time.monotonic() 的返回值）
+        timeout: 超时时间（秒）
+        stdout_log: 标准输出记录
+        stderr_log: 标准错误记录
+        
+    Returns:
+        超时返回 True，否则返回 False
+    """
+    # 只在 Windows 下用到，按需导入
+    import threading
+    
+    logs = {'STDOUT': stdout_log, 'STDERR': stderr_log}
+    # 每个输出流最后显示的一个字节，用于判断是否处于行首
+    last_byte = {'STDOUT': b'\n', 'STDERR': b'\n'}
+    
+    # 创建输出缓冲队列和线程
+    output_buffer = deque()
+    ready = threading.Event()
+    
+    # 启动输出读取线程
+    stdout_thread = threading.Thread(
+        target=stream_output, 
+        args=(process.stdout, output_buffer, ready, 'STDOUT')
+    )
+    stderr_thread = threading.Thread(
+        target=stream_output, 
+        args=(process.stderr, output_buffer, ready, 'STDERR')
+    )
+    
+    stdout_thread.start()
+    stderr_thread.start()
+    
+    sys.stdout.flush()
+    sys.stderr.flush()
+    
+    # 实时显示输出并收集完整输出
+    timed_out = False
+    while True:
+        ready.wait(timeout=0.1)
+        ready.clear()
+        
+        # 一次取出当前所有的输出
+        received = False
+        while True:
+            try:
+                source, data = output_buffer.popleft()
+            except IndexError:
+                break
+            logs[source].feed(data)
+            display_output(source, data, last_byte[source] in (b'\r', b'\n'))
+            last_byte[source] = data[-1:]
+            received = True
+        
+        if received:
+            flush_output()
+        elif process.poll() is not None:
+            # 进程已结束且没有新的输出
+            break
+        
+        # 检查超时
+        if timeout and (time.monotonic() - start_time) > timeout:
+            timed_out = True
+            break
+    
+    if not timed_out:
+        # 等待线程完成
+        stdout_thread.join(timeout=1)
+        stderr_thread.join(timeout=1)
+        
+        # 获取剩余输出
+        while output_buffer:
+            source, data = output_buffer.popleft()
+            logs[source].feed(data)
+            display_output(source, data, last_byte[source] in (b'\r', b'\n'))
+            last_byte[source] = data[-1:]
+    
+    # 记录残留的不完整行并补上换行
+    for source, log in logs.items():
+        log.finish()
+        if last_byte[source] != b'\n':
+            display_output(source, b'\n', False)
+    flush_output()
+    
+    return timed_out
 
 
 def parse_arguments() -> argparse.Namespace:
@@ -174,161 +611,172 @@ def parse_arguments() -> argparse.Namespace:
         help='程序运行超时时间（秒）'
     )
     
+    parser.add_argument(
+        '--capture',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help='捕获程序输出并在邮件中附带输出摘要（默认不捕获，子进程直接输出到终端）'
+    )
+    
+    parser.add_argument(
+        '--exec',
+        action='store_true',
+        help='配合 --no-email 使用：直接用命令替换当前进程，不再保留本脚本'
+             '（设置了 --timeout 或 --capture 时无效）'
+    )
+    
     return parser.parse_args()
 
 
 def run_command(
     command: List[str], 
-    timeout: Optional[int] = None
-) -> Tuple[int, str, str, float]:
+    timeout: Optional[int] = None,
+    capture: bool = False,
+    cmd_type: Optional[str] = None
+) -> Tuple[int, LogSummary, LogSummary, float]:
     """
-    运行命令并返回结果，支持实时输出显示和完整输出捕获
+    运行命令并返回结果
+    
+    默认走快速路径：子进程直接继承当前进程的标准输入输出，输出不经过本进程，
+    此时返回的标准输出和标准错误为空。capture 为 True 时通过管道实时显示输出，
+    并记录每个输出流的开头和结尾几行。
     
     Args:
         command: 要执行的命令列表
         timeout: 超时时间（秒）
+        capture: 是否捕获输出
+        cmd_type: 命令类型，未提供时自动检测
         
     Returns:
-        (退出码, 标准输出, 标准错误, 运行时间)
+        (退出码, 标准输出摘要, 标准错误摘要, 运行时间)
     """
-    start_time = time.time()
+    # 运行时间使用单调时钟计算，不受系统时间调整影响
+    start_time = time.monotonic()
     
     # 检测命令类型并适配shell环境
-    cmd_type = detect_command_type(command)
+    if cmd_type is None:
+        cmd_type = detect_command_type(command[0] if command else '')
     exec_command = get_shell_command(command)
+    # 在 try 之前初始化，输出执行信息时出错也能在异常处理中安全访问
+    process = None
     
     try:
         print(f"开始执行{cmd_type}命令: {' '.join(command)}")
         if exec_command != command:
             print(f"实际执行命令: {' '.join(exec_command)}")
-        print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"操作系统: {platform.system()}")
+        start_time_str = time.strftime('%Y-%m-%d %H:%M:%S')
+        print(f"开始时间: {start_time_str}")
+        print(f"操作系统: {_SYSTEM}")
         print("-" * 50)
         
-        # 创建进程，同时捕获输出和显示实时输出
-        process = subprocess.Popen(
-            exec_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,  # 行缓冲
-            universal_newlines=True
-        )
+        stdout_log = BoundedLog()
+        stderr_log = BoundedLog()
         
-        # 创建输出队列和线程
-        output_queue = Queue()
-        stdout_lines = []
-        stderr_lines = []
-        
-        # 启动输出读取线程
-        stdout_thread = threading.Thread(
-            target=stream_output, 
-            args=(process.stdout, output_queue, 'STDOUT')
-        )
-        stderr_thread = threading.Thread(
-            target=stream_output, 
-            args=(process.stderr, output_queue, 'STDERR')
-        )
-        
-        stdout_thread.start()
-        stderr_thread.start()
-        
-        # 实时显示输出并收集完整输出
-        while True:
-            try:
-                # 非阻塞获取输出
-                source, line = output_queue.get(timeout=0.1)
-                if source == 'STDOUT':
-                    print(line)
-                    stdout_lines.append(line)
-                elif source == 'STDERR':
-                    print(f"[stderr] {line}", file=sys.stderr)
-                    stderr_lines.append(line)
-            except Empty:
-                # 检查进程是否还在运行
-                if process.poll() is not None:
-                    break
-                    
-                # 检查超时
-                if timeout and (time.time() - start_time) > timeout:
-                    process.terminate()
-                    try:
-                        process.wait(timeout=5)
-                    except subprocess.TimeoutExpired:
-                        process.kill()
-                        process.wait()
-                    
-                    end_time = time.time()
-                    duration = end_time - start_time
-                    error_msg = f"命令执行超时（{timeout}秒）"
-                    print(f"\n错误: {error_msg}")
-                    return 124, '\n'.join(stdout_lines), error_msg, duration
-        
-        # 等待线程完成
-        stdout_thread.join(timeout=1)
-        stderr_thread.join(timeout=1)
-        
-        # 获取剩余输出
-        while not output_queue.empty():
+        if capture:
+            # 创建进程，同时捕获输出和显示实时输出
+            process = subprocess.Popen(
+                exec_command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **_SPAWN_KWARGS
+            )
+            
+            collect_output = collect_output_selector if _USE_SELECTOR else collect_output_threaded
+            timed_out = collect_output(process, start_time, timeout, stdout_log, stderr_log)
+            
+            if timed_out:
+                terminate_process(process)
+            else:
+                # 等待进程完成
+                process.wait()
+            
+            returncode = process.returncode
+        else:
+            # 快速路径：子进程直接写入终端，输出不经过本进程
             try:
-                source, line = output_queue.get_nowait()
-                if source == 'STDOUT':
-                    stdout_lines.append(line)
-                elif source == 'STDERR':
-                    stderr_lines.append(line)
-            except Empty:
-                break
-        
-        # 等待进程完成
-        process.wait()
+                returncode = subprocess.run(
+                    exec_command,
+                    stdin=None,
+                    stdout=None,
+                    stderr=None,
+                    timeout=timeout,
+                    **_SPAWN_KWARGS
+                ).returncode
+                timed_out = False
+            except subprocess.TimeoutExpired:
+                # subprocess.run 超时时已经结束了子进程
+                timed_out = True
         
-        end_time = time.time()
-        duration = end_time - start_time
+        if timed_out:
+            duration = time.monotonic() - start_time
+            error_msg = f"命令执行超时（{timeout}秒）"
+            print(f"\n错误: {error_msg}")
+            return 124, stdout_log.summary(), BoundedLog.from_message(error_msg).summary(), duration
         
-        stdout_output = '\n'.join(stdout_lines)
-        stderr_output = '\n'.join(stderr_lines)
+        duration = time.monotonic() - start_time
         
         print("-" * 50)
         print(f"命令执行完成")
-        print(f"结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"结束时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"运行时间: {duration:.2f} 秒")
-        print(f"退出码: {process.returncode}")
+        print(f"退出码: {returncode}")
         
-        if stderr_output:
-            print(f"错误输出长度: {len(stderr_output)} 字符")
-        if stdout_output:
-            print(f"标准输出长度: {len(stdout_output)} 字符")
+        if stderr_log.total_lines:
+            print(f"错误输出: {stderr_log.total_lines} 行")
+        if stdout_log.total_lines:
+            print(f"标准输出: {stdout_log.total_lines} 行")
         
-        return process.returncode, stdout_output, stderr_output, duration
+        return returncode, stdout_log.summary(), stderr_log.summary(), duration
         
     except FileNotFoundError:
-        end_time = time.time()
-        duration = end_time - start_time
+        duration = time.monotonic() - start_time
         error_msg = f"找不到命令: {exec_command[0] if exec_command else 'unknown'}"
         print(f"错误: {error_msg}")
-        return 127, "", error_msg, duration  # 127 是命令未找到的退出码
+        return 127, BoundedLog().summary(), BoundedLog.from_message(error_msg).summary(), duration  # 127 是命令未找到的退出码
         
     except Exception as e:
-        end_time = time.time()
-        duration = end_time - start_time
+        # 读取输出时出错也不能让子进程继续在后台运行
+        if process is not None and process.poll() is None:
+            terminate_process(process)
+        
+        duration = time.monotonic() - start_time
         error_msg = f"执行命令时发生错误: {str(e)}"
         print(f"错误: {error_msg}")
-        return 1, "", error_msg, duration
+        return 1, BoundedLog().summary(), BoundedLog.from_message(error_msg).summary(), duration
 
 
 def format_duration(seconds: float) -> str:
     """格式化运行时间"""
-    if seconds < 60:
-        return f"{seconds:.1f} 秒"
-    elif seconds < 3600:
-        minutes = int(seconds // 60)
-        remaining_seconds = seconds % 60
-        return f"{minutes} 分 {remaining_seconds:.1f} 秒"
-    else:
-        hours = int(seconds // 3600)
-        remaining_minutes = int((seconds % 3600) // 60)
-        remaining_seconds = seconds % 60
-        return f"{hours} 小时 {remaining_minutes} 分 {remaining_seconds:.1f} 秒"
+    hours, remainder = divmod(seconds, 3600)
+    minutes, remaining_seconds = divmod(remainder, 60)
+    if hours:
+        return f"{int(hours)} 小时 {int(minutes)} 分 {remaining_seconds:.1f} 秒"
+    if minutes:
+        return f"{int(minutes)} 分 {remaining_seconds:.1f} 秒"
+    return f"{remaining_seconds:.1f} 秒"
+
+
+def format_log_summary(title: str, summary: LogSummary) -> str:
+    """
+    将输出摘要格式化为邮件中的一段文本
+    
+    Args:
+        title: 段落标题
+        summary: 输出摘要
+        
+    Returns:
+        以空行开头的邮件段落
+    """
+    if summary.total <= len(summary.head) + len(summary.tail):
+        # 开头和结尾已覆盖全部输出
+        return f"\n\n{title}:\n" + '\n'.join(summary.head + summary.tail)
+    
+    return (
+        f"\n\n{title} (前{len(summary.head)}行和最后{len(summary.tail)}行):\n"
+        + '\n'.join(summary.head)
+        + f"\n... (共 {summary.total} 行输出)\n"
+        + '\n'.join(summary.tail)
+    )
 
 
 def main():
@@ -358,16 +806,35 @@ def main():
             print("请设置环境变量或使用 --no-email 参数")
             args.no_email = True
     
+    # 不需要邮件、超时和输出捕获时，直接用命令替换当前进程
+    # Windows 下 exec 无法真正替换进程，不使用该方式
+    if args.exec and args.no_email and not args.timeout and not args.capture and os.name != 'nt':
+        exec_command = get_shell_command(command)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            os.execvp(exec_command[0], exec_command)
+        except FileNotFoundError:
+            print(f"错误: 找不到命令: {exec_command[0]}")
+            sys.exit(127)
+        except OSError as e:
+            print(f"错误: 执行命令时发生错误: {e}")
+            sys.exit(1)
+    
+    # 检测命令类型，用于执行信息和邮件标题
+    cmd_type = detect_command_type(command[0] if command else '')
+    
     # 运行命令
-    exit_code, stdout, stderr, duration = run_command(command, args.timeout)
+    exit_code, stdout, stderr, duration = run_command(command, args.timeout, args.capture, cmd_type)
     
     # 发送邮件通知
     if not args.no_email:
         try:
+            # 只在需要发送邮件时才导入邮件模块（smtplib、email 等）
+            from send_email import EmailNotifier
+            
             notifier = EmailNotifier()
             
-            # 检测命令类型，用于更好的邮件标题
-            cmd_type = detect_command_type(command)
             cmd_type_cn = {
                 'python': 'Python程序',
                 'system': '系统命令',
@@ -379,13 +846,8 @@ def main():
                 extra_info = f"命令类型: {cmd_type_cn}\n运行时间: {format_duration(duration)}"
                 
                 # 如果有输出，添加输出摘要
-                if stdout:
-                    output_lines = stdout.strip().split('\n')
-                    if len(output_lines) <= 10:
-                        extra_info += f"\n\n输出内容:\n{stdout.strip()}"
-                    else:
-                        extra_info += f"\n\n输出摘要 (前5行):\n" + '\n'.join(output_lines[:5])
-                        extra_info += f"\n... (共 {len(output_lines)} 行输出)"
+                if args.capture and stdout.total:
+                    extra_info += format_log_summary("输出内容", stdout)
                 
                 notifier.send_notification(program_name, "SUCCESS", extra_info)
                 print("✅ 邮件通知发送成功")
@@ -394,20 +856,17 @@ def main():
                 extra_info = f"命令类型: {cmd_type_cn}\n退出码: {exit_code}\n运行时间: {format_duration(duration)}"
                 
                 # 添加错误信息
-                if stderr:
-                    stderr_lines = stderr.strip().split('\n')
-                    if len(stderr_lines) <= 5:
-                        extra_info += f"\n\n错误输出:\n{stderr.strip()}"
-                    else:
-                        extra_info += f"\n\n错误输出 (最后5行):\n" + '\n'.join(stderr_lines[-5:])
+                if not args.capture:
+                    # 未捕获输出时 stderr 只可能是本脚本产生的错误信息（如超时）
+                    if stderr.total:
+                        extra_info += format_log_summary("错误信息", stderr)
+                    extra_info += "\n\n(未捕获程序输出，可使用 --capture 在邮件中附带输出摘要)"
+                elif stderr.total:
+                    extra_info += format_log_summary("错误输出", stderr)
                 
                 # 如果有标准输出，也包含一些
-                if stdout:
-                    stdout_lines = stdout.strip().split('\n')
-                    if len(stdout_lines) <= 3:
-                        extra_info += f"\n\n标准输出:\n{stdout.strip()}"
-                    else:
-                        extra_info += f"\n\n标准输出 (最后3行):\n" + '\n'.join(stdout_lines[-3:])
+                if args.capture and stdout.total:
+                    extra_info += format_log_summary("标准输出", stdout)
                 
                 notifier.send_notification(program_name, "FAILURE", extra_info)
                 print("邮件通知发送成功")
@@ -14,15 +14,56 @@
     from send_email import EmailNotifier
     notifier = EmailNotifier()
     notifier.send_notification("程序名称", "SUCCESS", "运行时间: 10分钟")
+    
+    # 复用同一个SMTP连接发送多封邮件
+    with EmailNotifier() as notifier:
+        notifier.send_batch([
+            ("任务A", "SUCCESS", ""),
+            ("任务B", "FAILURE", "退出码: 1"),
+        ])
 """
 
 import smtplib
 import os
 import sys
 import socket
+import copy
+import base64
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from email.message import EmailMessage
-from typing import Optional
+from typing import Dict, List, Optional, Tuple, Union
+
+
+# QQ邮箱在QUIT阶段直接断开连接时返回的响应内容
+_QUIT_SENTINEL = b'\x00\x00\x00'
+
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 邮件正文模板，{hostname} 在初始化时替换，其余字段在发送时填充
+_SUCCESS_TEMPLATE = """程序 '{program_name}' 已成功运行结束。
+
+📊 运行信息:
+{extra_info}
+
+🖥️  系统信息:
+运行时间: {current_time}
+主机名称: {hostname}
+
+此邮件由自动化脚本发送。"""
+
+_FAILURE_TEMPLATE = """程序 '{program_name}' 在运行时发生错误。
+
+❌ 错误信息:
+{extra_info}
+
+🖥️  系统信息:
+运行时间: {current_time}
+主机名称: {hostname}
+
+请检查程序日志以获取更多详细信息。
+
+此邮件由自动化脚本发送。"""
 
 
 class EmailNotifier:
@@ -31,47 +72,123 @@ class EmailNotifier:
     def __init__(
         self, 
         sender_email: str = "xxxx@qq.com",
-        recipient_email: str = "xxxxx@std.uestc.edu.cn",
+        recipient_email: Union[str, List[str]] = "xxxxx@std.uestc.edu.cn",
         smtp_server: str = "smtp.qq.com",
-        smtp_port: int = 465
+        smtp_port: int = 465,
+        max_parallel: int = 8
     ):
         """
         初始化邮件通知器
         
         Args:
             sender_email: 发送者邮箱
-            recipient_email: 接收者邮箱
+            recipient_email: 接收者邮箱，可以是多个邮箱组成的列表
             smtp_server: SMTP服务器地址
             smtp_port: SMTP服务器端口
+            max_parallel: 多个收件人时的最大并发连接数（避免触发邮件服务商的频率限制）
         """
         self.sender_email = sender_email
         self.recipient_email = recipient_email
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
+        self.max_parallel = max_parallel
         self.sender_password = os.environ.get('EMAIL_APP_PASSWORD')
         
         if not self.sender_password:
             raise ValueError("环境变量 EMAIL_APP_PASSWORD 未设置")
-    
-    def _get_system_info(self) -> dict:
-        """获取系统信息"""
+        
+        # 持久连接，仅在 with 语句块或 send_batch 期间存在
+        self._smtp: Optional[smtplib.SMTP_SSL] = None
+        
+        # 主机名在运行期间不会变化，只获取一次并写入正文模板
         try:
             hostname = socket.gethostname()
         except Exception:
             hostname = "未知主机"
-            
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._success_template = _SUCCESS_TEMPLATE.replace('{hostname}', hostname)
+        self._failure_template = _FAILURE_TEMPLATE.replace('{hostname}', hostname)
         
-        return {
-            'hostname': hostname,
-            'current_time': current_time
-        }
+        # 发件人地址只解析一次，之后的邮件直接复用解析好的邮件头
+        prototype = EmailMessage()
+        prototype['From'] = sender_email
+        self._from_header = prototype['From']
+    
+    def __enter__(self) -> 'EmailNotifier':
+        self.connect()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
+    def connect(self) -> None:
+        """建立SMTP连接并登录，之后的发送复用该连接"""
+        if self._smtp is None:
+            self._smtp = self._open_connection()
+    
+    def close(self) -> None:
+        """关闭SMTP连接"""
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            self._close_connection(smtp)
+    
+    def _open_connection(self) -> smtplib.SMTP_SSL:
+        """建立一个新的SMTP连接并登录"""
+        smtp = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port)
+        try:
+            self._login(smtp)
+        except Exception:
+            smtp.close()
+            raise
+        return smtp
+    
+    def _login(self, smtp: smtplib.SMTP_SSL) -> None:
+        """
+        登录SMTP服务器
+        
+        服务器支持 AUTH PLAIN 时把用户名和密码放在同一条命令中发送，只需一次
+        往返；否则交给 smtplib 自行选择认证方式。
+        """
+        smtp.ehlo_or_helo_if_needed()
+        
+        auth_methods = smtp.esmtp_features.get('auth', '').upper().split()
+        if 'PLAIN' not in auth_methods:
+            smtp.login(self.sender_email, self.sender_password)
+            return
+        
+        credentials = f"\0{self.sender_email}\0{self.sender_password}".encode('utf-8')
+        code, response = smtp.docmd('AUTH', 'PLAIN ' + base64.b64encode(credentials).decode('ascii'))
+        if code not in (235, 503):
+            # 503 表示已经认证过
+            raise smtplib.SMTPAuthenticationError(code, response)
+    
+    def _close_connection(self, smtp: smtplib.SMTP_SSL) -> None:
+        """关闭SMTP连接"""
+        try:
+            smtp.quit()
+        except smtplib.SMTPResponseException as e:
+            # 忽略QUIT阶段的连接关闭错误（邮件已发送成功）
+            if not self._is_quit_error(e):
+                raise
+        except smtplib.SMTPServerDisconnected:
+            pass
+        finally:
+            smtp.close()
+    
+    @staticmethod
+    def _is_quit_error(e: smtplib.SMTPResponseException) -> bool:
+        """检查是否是QUIT阶段服务器直接断开连接导致的错误"""
+        return (
+            e.smtp_code == -1
+            and isinstance(e.smtp_error, bytes)
+            and e.smtp_error.find(_QUIT_SENTINEL) != -1
+        )
     
     def _create_email_content(
         self, 
         program_name: str, 
         status: str, 
-        extra_info: str = ""
+        extra_info: str = "",
+        current_time: Optional[str] = None
     ) -> tuple[str, str]:
         """
         创建邮件内容
@@ -80,46 +197,52 @@ class EmailNotifier:
             program_name: 程序名称
             status: 运行状态 (SUCCESS/FAILURE)
             extra_info: 额外信息
+            current_time: 邮件中显示的时间，默认为当前时间
             
         Returns:
             (邮件主题, 邮件正文)
         """
-        system_info = self._get_system_info()
+        if current_time is None:
+            current_time = datetime.now().strftime(_TIME_FORMAT)
+        
+        fields = {
+            'program_name': program_name,
+            'extra_info': extra_info,
+            'current_time': current_time
+        }
         
         if status.upper() == 'SUCCESS':
             subject = f"✅ 程序 {program_name} 运行完成"
-            body = f"""程序 '{program_name}' 已成功运行结束。
-
-📊 运行信息:
-{extra_info}
-
-🖥️  系统信息:
-运行时间: {system_info['current_time']}
-主机名称: {system_info['hostname']}
-
-此邮件由自动化脚本发送。"""
+            body = self._success_template.format_map(fields)
         else:
             subject = f"❌ 程序 {program_name} 运行失败"
-            body = f"""程序 '{program_name}' 在运行时发生错误。
-
-❌ 错误信息:
-{extra_info}
-
-🖥️  系统信息:
-运行时间: {system_info['current_time']}
-主机名称: {system_info['hostname']}
-
-请检查程序日志以获取更多详细信息。
-
-此邮件由自动化脚本发送。"""
+            body = self._failure_template.format_map(fields)
         
         return subject, body
     
+    def _create_message(
+        self, 
+        program_name: str, 
+        status: str, 
+        extra_info: str = "",
+        current_time: Optional[str] = None
+    ) -> EmailMessage:
+        """创建不含收件人的邮件对象"""
+        subject, body = self._create_email_content(program_name, status, extra_info, current_time)
+        
+        msg = EmailMessage()
+        msg['Subject'] = subject
+        msg['From'] = self._from_header
+        msg.set_content(body)
+        return msg
+    
     def send_notification(
         self, 
         program_name: str, 
         status: str, 
-        extra_info: str = ""
+        extra_info: str = "",
+        recipients: Optional[Union[str, List[str]]] = None,
+        current_time: Optional[str] = None
     ) -> bool:
         """
         发送邮件通知
@@ -128,43 +251,172 @@ class EmailNotifier:
             program_name: 程序名称
             status: 运行状态 (SUCCESS/FAILURE)
             extra_info: 额外信息
+            recipients: 收件人，默认使用初始化时的 recipient_email；
+                多个收件人时并发发送
+            current_time: 邮件中显示的时间，默认为当前时间
             
         Returns:
             发送成功返回 True，失败返回 False
             
+        Raises:
+            Exception: 邮件发送失败时抛出异常
+        """
+        recipients = self._recipient_list(recipients)
+        if len(recipients) > 1:
+            return self.send_fanout(recipients, program_name, status, extra_info, current_time)
+        
+        # 创建邮件对象
+        msg = self._create_message(program_name, status, extra_info, current_time)
+        msg['To'] = recipients[0]
+        
+        return self._send_message(msg)
+    
+    def _recipient_list(self, recipients: Optional[Union[str, List[str]]]) -> List[str]:
+        """将收件人参数统一为列表，未指定时使用初始化时的 recipient_email"""
+        if recipients is None:
+            recipients = self.recipient_email
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        if not recipients:
+            raise ValueError("收件人列表为空，至少需要一个收件人")
+        return recipients
+    
+    def _send_message(self, msg: EmailMessage) -> bool:
+        """
+        发送已创建好的邮件，有持久连接时复用，否则使用临时连接
+        
         Raises:
             Exception: 邮件发送失败时抛出异常
         """
         try:
-            # 创建邮件内容
-            subject, body = self._create_email_content(program_name, status, extra_info)
+            if self._smtp is None:
+                with self:
+                    result = self._smtp.send_message(msg)
+            else:
+                result = self._smtp.send_message(msg)
             
-            # 创建邮件对象
-            msg = EmailMessage()
-            msg['Subject'] = subject
-            msg['From'] = self.sender_email
-            msg['To'] = self.recipient_email
-            msg.set_content(body)
+            # 检查发送结果 - 空字典表示所有收件人都成功
+            if not result:
+                return True
+            else:
+                raise Exception(f"部分收件人发送失败: {result}")
             
-            # 发送邮件
-            with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port) as smtp_server:
-                smtp_server.login(self.sender_email, self.sender_password)
-                result = smtp_server.send_message(msg)
-                
-                # 检查发送结果 - 空字典表示所有收件人都成功
-                if not result:
-                    return True
-                else:
-                    raise Exception(f"部分收件人发送失败: {result}")
-                    
         except smtplib.SMTPResponseException as e:
-            # 检查是否是QUIT阶段的错误（邮件已发送成功）
-            if e.smtp_code == -1 and hasattr(e, 'smtp_error') and b'\x00\x00\x00' in e.smtp_error:
-                return True  # 忽略QUIT阶段的连接关闭错误
-            else:
-                raise Exception(f"SMTP错误: {e}")
+            raise Exception(f"SMTP错误: {e}")
         except Exception as e:
             raise Exception(f"邮件发送失败: {e}")
+    
+    def send_fanout(
+        self,
+        recipients: List[str],
+        program_name: str,
+        status: str,
+        extra_info: str = "",
+        current_time: Optional[str] = None
+    ) -> bool:
+        """
+        并发地向多个收件人发送同一封邮件通知，每个收件人使用独立的SMTP连接
+        
+        Args:
+            recipients: 收件人列表
+            program_name: 程序名称
+            status: 运行状态 (SUCCESS/FAILURE)
+            extra_info: 额外信息
+            current_time: 邮件中显示的时间，默认为当前时间
+            
+        Returns:
+            全部发送成功返回 True
+            
+        Raises:
+            Exception: 任意收件人发送失败时抛出异常，包含所有失败的收件人
+        """
+        if not recipients:
+            raise ValueError("收件人列表为空，至少需要一个收件人")
+        
+        # 邮件内容只创建一次，各线程复制后再设置收件人
+        msg = self._create_message(program_name, status, extra_info, current_time)
+        
+        failures: Dict[str, Exception] = {}
+        max_workers = max(1, min(self.max_parallel, len(recipients)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                recipient: executor.submit(self._send_one, msg, recipient)
+                for recipient in recipients
+            }
+            for recipient, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    failures[recipient] = e
+        
+        if failures:
+            details = '; '.join(f"{recipient}: {e}" for recipient, e in failures.items())
+            raise Exception(f"邮件发送失败: {len(failures)}/{len(recipients)} 个收件人发送失败 ({details})")
+        
+        return True
+    
+    def _send_one(self, msg: EmailMessage, recipient: str) -> None:
+        """使用独立的SMTP连接向单个收件人发送邮件"""
+        msg = copy.deepcopy(msg)
+        msg['To'] = recipient
+        
+        smtp = self._open_connection()
+        try:
+            result = smtp.send_message(msg)
+        finally:
+            self._close_connection(smtp)
+        
+        if result:
+            raise Exception(f"部分收件人发送失败: {result}")
+    
+    def send_batch(self, items: List[Tuple[str, str, str]]) -> bool:
+        """
+        通过同一个SMTP连接批量发送邮件通知
+        
+        Args:
+            items: (程序名称, 运行状态, 额外信息) 列表
+            
+        Returns:
+            全部发送成功返回 True
+            
+        Raises:
+            Exception: 任意一封邮件发送失败时抛出异常
+        """
+        # 同一批邮件使用相同的发送时间
+        current_time = datetime.now().strftime(_TIME_FORMAT)
+        
+        recipients = self._recipient_list(None)
+        if len(recipients) > 1:
+            # 多个收件人时每封邮件都并发发送，各自使用独立连接
+            for program_name, status, extra_info in items:
+                self.send_fanout(recipients, program_name, status, extra_info, current_time)
+            return True
+        
+        # 已在 with 语句块中时复用现有连接，否则为本次批量发送建立连接
+        owns_connection = self._smtp is None
+        if owns_connection:
+            self.connect()
+        
+        try:
+            msg = None
+            for program_name, status, extra_info in items:
+                if msg is None:
+                    msg = self._create_message(program_name, status, extra_info, current_time)
+                    msg['To'] = recipients[0]
+                else:
+                    # 复用同一个邮件对象，只替换主题和正文
+                    subject, body = self._create_email_content(
+                        program_name, status, extra_info, current_time
+                    )
+                    msg.replace_header('Subject', subject)
+                    msg.set_content(body)
+                
+                self._send_message(msg)
+        finally:
+            if owns_connection:
+                self.close()
+        
+        return True
 
 
 def main():
@@ -179,8 +431,8 @@ def main():
     extra_info = sys.argv[3] if len(sys.argv) > 3 else ""
     
     try:
-        notifier = EmailNotifier()
-        success = notifier.send_notification(program_name, status, extra_info)
+        with EmailNotifier() as notifier:
+            success = notifier.send_notification(program_name, status, extra_info)
         
         if success:
             print("邮件发送成功！")